@@ -1,11 +1,18 @@
-import streamlit as st
 import time
+import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
 
 # Import modules from restructured codebase
-from src.api import fetch_all_members, fetch_subscription_activities
-from src.data import process_members_data, process_subscription_activities, calculate_mrr
+from src.api import (
+    MEMBERS_PAGE_SIZE,
+    MEMBER_STATES,
+    clear_response_cache,
+    fetch_next_member_pages,
+    fetch_subscription_activities
+)
+from src.data import process_members_data, process_subscription_activities, calculate_mrr, flatten_orders
+from src.utils import save_data_cache, load_data_cache, clear_data_cache
 from src.ui import check_password, display_membership_metrics, show_member_directory
 from src.visualizations import (
     show_member_growth, 
@@ -14,6 +21,20 @@ from src.visualizations import (
     show_member_activities
 )
 
+# How long fetched member and activity data stays fresh
+DATA_TTL_SECONDS = 24 * 60 * 60
+
+# Session state keys holding fetched data or values derived from it.
+# Register any new cache key here so the refresh button clears it.
+CACHE_KEYS = {
+    "members_data",
+    "members_df",
+    "subs_df",
+    "active_subs",
+    "orders_df",
+    "activities_cache",
+}
+
 # App configuration
 st.set_page_config(
     page_title="Maine Ad + Design membership dashboard",
@@ -35,33 +56,17 @@ debug_mode = st.sidebar.checkbox("Debug mode")
 # Add a refresh button in the sidebar
 refresh_data = False
 
-# Check if the data cache should expire (every 24 hours)
-if "last_fetch_time" in st.session_state:
-    last_fetch_time = st.session_state.last_fetch_time
-    current_time = datetime.now()
-    time_difference = current_time - last_fetch_time
-    # Force refresh if data is older than 24 hours
-    if time_difference.total_seconds() > 24 * 60 * 60:
-        refresh_data = True
-        st.toast("Data cache expired. Refreshing...", icon="🔄")
+# Check if the data cache should expire (every 24 hours), against a deadline set at fetch time
+if time.monotonic() >= st.session_state.get("data_expires_monotonic", float("inf")):
+    refresh_data = True
+    st.toast("Data cache expired. Refreshing...", icon="🔄")
 
 if debug_mode:
     with st.sidebar:
         # Add refresh button
         if st.button("🔄 Refresh data"):
-            # Clear the cache to force a refresh
-            if "members_data" in st.session_state:
-                del st.session_state.members_data
-            if "members_df" in st.session_state:
-                del st.session_state.members_df
-            if "subs_df" in st.session_state:
-                del st.session_state.subs_df
-            if "consolidated_members_cache" in st.session_state:
-                del st.session_state.consolidated_members_cache
-            # Clear all dependent caches too
-            for key in list(st.session_state.keys()):
-                if key.endswith("_cache"):
-                    del st.session_state[key]
+            # Cached session data is dropped below; also skip cached API responses
+            clear_response_cache()
             refresh_data = True
             st.toast("Data cache cleared. Refreshing...", icon="🔄")
         
@@ -72,57 +77,137 @@ if debug_mode:
 
 # For education feature, force a refresh when running the app for the first time with the new code
 if "education_feature_added" not in st.session_state:
-    refresh_data = True
+    # Only data already in this session can predate the feature; the disk cache is written with it
+    if "members_data" in st.session_state:
+        refresh_data = True
     st.session_state.education_feature_added = True
-    # Also clear member caches to ensure they have the education flag
-    if "all_members_cache" in st.session_state:
-        del st.session_state.all_members_cache
-    if "consolidated_members_cache" in st.session_state:
-        del st.session_state.consolidated_members_cache
+
+@st.fragment(run_every=0.5)
+def load_and_display_members():
+    """
+    Fetch the next page of each member cursor chain per fragment run
+    
+    Active and inactive members are paged concurrently, and each round lands in
+    st.session_state.partial_pages, so the rest of the UI (sidebar toggles,
+    refresh button) stays responsive between pages instead of waiting on the
+    full paginated fetch.
+    """
+    # Nothing left to fetch if a finished or failed load already rerun the app
+    if "partial_pages" not in st.session_state:
+        return
+    
+    result = fetch_next_member_pages(st.session_state.members_cursors, debug_mode=debug_mode)
+    
+    # A failed page leaves the member list incomplete, so drop it instead of saving partial data
+    # and rerun the whole app, which shows the error without scheduling this fragment again
+    if result is None:
+        st.session_state.pop("partial_pages", None)
+        st.session_state.pop("members_cursors", None)
+        st.session_state.members_load_failed = True
+        st.rerun()
+    
+    page_members, st.session_state.members_cursors = result
+    st.session_state.partial_pages.append(page_members)
+    has_next_page = bool(st.session_state.members_cursors)
+    
+    loaded_count = sum(len(page_members) for page_members in st.session_state.partial_pages)
+    if has_next_page:
+        # The API reports no total, so estimate from the previous load's member count
+        expected_count = max(
+            st.session_state.get("last_member_count", 0),
+            loaded_count + MEMBERS_PAGE_SIZE * len(st.session_state.members_cursors)
+        )
+        st.progress(
+            min(int(100 * loaded_count / expected_count), 99),
+            text=f"Fetching member data (this may take a moment)... {loaded_count} members loaded so far"
+        )
+        return
+    
+    # All pages have arrived, and a failed request stops above, so this is the complete member list
+    members_data = [member for page_members in st.session_state.pop("partial_pages") for member in page_members]
+    st.session_state.pop("members_cursors", None)
+    
+    if not members_data:
+        st.session_state.members_load_failed = True
+        st.rerun()
+    
+    # Process data into a usable format
+    st.toast(f"Successfully loaded data for {len(members_data)} members.", icon="🎉")
+    
+    # Cache the raw data
+    st.session_state.members_data = members_data
+    
+    # Kept across refreshes to size the next load's progress bar
+    st.session_state.last_member_count = len(members_data)
+    
+    # Process the data into DataFrames
+    members_df, subs_df = process_members_data(members_data)
+    
+    # Cache the processed dataframes
+    st.session_state.members_df = members_df
+    st.session_state.subs_df = subs_df
+    
+    # Update the last fetch timestamp and the monotonic expiry deadline
+    st.session_state.last_fetch_time = datetime.now()
+    st.session_state.data_expires_monotonic = time.monotonic() + DATA_TTL_SECONDS
+    
+    # Persist to disk so a process restart can skip the API fetch
+    save_data_cache(members_data, members_df, subs_df, st.session_state.last_fetch_time)
+    
+    # Render the dashboard with the freshly loaded data
+    st.rerun()
+
+# Drop the cached data and everything derived from it so the loader fetches it again
+if refresh_data:
+    for key in CACHE_KEYS:
+        st.session_state.pop(key, None)
+    # Clear the timestamps too so an expired cache only triggers one refresh
+    st.session_state.pop("last_fetch_time", None)
+    st.session_state.pop("data_expires_monotonic", None)
+    clear_data_cache()
+
+# After a process restart, reuse the on-disk cache if it is less than 24 hours old
+if "members_data" not in st.session_state and "partial_pages" not in st.session_state:
+    cached = load_data_cache(max_age_seconds=DATA_TTL_SECONDS)
+    if cached:
+        (st.session_state.members_data, st.session_state.members_df,
+         st.session_state.subs_df, st.session_state.last_fetch_time) = cached
+        # The monotonic clock restarts with the process, so carry over only the remaining lifetime
+        age_seconds = (datetime.now() - st.session_state.last_fetch_time).total_seconds()
+        st.session_state.data_expires_monotonic = time.monotonic() + DATA_TTL_SECONDS - age_seconds
 
 # Check if data is already in session state
-if "members_data" not in st.session_state or refresh_data:
-    # Loading indicator
-    with st.spinner("Loading membership data..."):        
-        # Fetch all members with pagination
-        progress_text = "Fetching member data (this may take a moment)..."
-        progress_bar = st.progress(0, text=progress_text)
-        
-        for percent_complete in range(0, 100, 10):  # Simulate progress in increments
-            time.sleep(0.1)  # Simulate work being done
-            progress_bar.progress(percent_complete, text=progress_text)
-        
-        members_data = fetch_all_members(debug_mode)
-        progress_bar.progress(100, text="Data fetching complete!")
-        progress_bar.empty()  # Remove the progress bar when complete
-        
-        if debug_mode:
-            st.expander("Members Data Sample").json(members_data[:5] if members_data else [])
-        
-        if not members_data:
-            st.error("Failed to load data. Please check API key and connection.")
-            st.stop()
-        
-        # Process data into a usable format
-        st.toast(f"Successfully loaded data for {len(members_data)} members.", icon="🎉")
-        
-        # Cache the raw data
-        st.session_state.members_data = members_data
-        
-        # Process the data into DataFrames
-        members_df, subs_df = process_members_data(members_data)
-        
-        # Cache the processed dataframes
-        st.session_state.members_df = members_df
-        st.session_state.subs_df = subs_df
-        
-        # Update the last fetch timestamp
-        st.session_state.last_fetch_time = datetime.now()
-else:
-    # Use cached data
-    members_data = st.session_state.members_data
-    members_df = st.session_state.members_df
-    subs_df = st.session_state.subs_df
+if "members_data" not in st.session_state:
+    # Show a failed load once without starting the loader again; the next rerun retries
+    if st.session_state.pop("members_load_failed", False) and not refresh_data:
+        st.error("Failed to load data. Please check API key and connection.")
+        st.stop()
+    
+    # Start a new paginated fetch unless one is already in progress
+    if "partial_pages" not in st.session_state or refresh_data:
+        st.session_state.partial_pages = []
+        st.session_state.members_cursors = {state: None for state in MEMBER_STATES}
+    
+    load_and_display_members()
+    st.stop()
+
+# Use cached data
+members_data = st.session_state.members_data
+members_df = st.session_state.members_df
+subs_df = st.session_state.subs_df
+
+# Filter active subscriptions once and share them with the metrics and plan views
+if "active_subs" not in st.session_state:
+    st.session_state.active_subs = subs_df[subs_df["active"]] if not subs_df.empty else subs_df
+active_subs = st.session_state.active_subs
+
+# Flatten every member's orders once for the order totals and revenue views
+if "orders_df" not in st.session_state:
+    st.session_state.orders_df = flatten_orders(members_data)
+orders_df = st.session_state.orders_df
+
+if debug_mode:
+    st.expander("Members Data Sample").json(members_data[:5] if members_data else [])
 
 # Display dashboard with membership metrics and visualizations
 if 'members_df' in locals() and not members_df.empty:
@@ -141,14 +226,18 @@ if 'members_df' in locals() and not members_df.empty:
         main_tabs = st.tabs(["Activities", "Member growth", "Plans and revenue", "Member directory"])
     
     if not subs_df.empty:
-        # Fetch activity data for enhanced visualizations if not already in session state
-        # Always force refresh activity data to ensure calculations are updated
-        refresh_activities = True
+        # Fetch activity data if it is missing or older than the 24 hour data TTL
+        activities_fetch_time = st.session_state.get("activities_fetch_time", datetime.min)
+        refresh_activities = (
+            "activities_cache" not in st.session_state
+            or (datetime.now() - activities_fetch_time).total_seconds() > DATA_TTL_SECONDS
+        )
             
         if refresh_activities:
             with st.spinner("Fetching recent subscription activities..."):
-                # Get activity data for the past 12 months for more complete financial history
-                twelve_months_ago = datetime.now() - timedelta(days=365)
+                # Get activity data for the past 12 months for more complete financial history,
+                # starting at midnight so repeat fetches on the same day send the same query
+                twelve_months_ago = (datetime.now() - timedelta(days=365)).replace(hour=0, minute=0, second=0, microsecond=0)
                 activities_data = fetch_subscription_activities(twelve_months_ago, debug_mode=debug_mode)
                 
                 # Process activity data if we have any
@@ -159,18 +248,19 @@ if 'members_df' in locals() and not members_df.empty:
                     if debug_mode and not activities_df.empty:
                         st.write("First 5 activities MRR values:")
                         debug_sample = activities_df.head(5)
-                        for i, row in debug_sample.iterrows():
-                            st.write(f"{row.get('type')} - {row.get('plan_name')} - ${row.get('mrr_impact_dollars'):.2f}/month")
+                        lines = (
+                            debug_sample["type"].astype(str) + " - "
+                            + debug_sample["plan_name"].astype(str) + " - "
+                            + debug_sample["mrr_impact_dollars"].map("${:.2f}/month".format)
+                        )
+                        st.text("\n".join(lines))
                     
                     # Store in session state
                     st.session_state.activities_cache = activities_df
                 else:
                     st.session_state.activities_cache = pd.DataFrame()  # Empty DataFrame
-                    
-                # Force clear all computed MRR data to ensure fresh calculation
-                for key in list(st.session_state.keys()):
-                    if "mrr" in key.lower() and key != "activities_cache":
-                        del st.session_state[key]
+                
+                st.session_state.activities_fetch_time = datetime.now()
         
         # Activities tab (now the first tab)
         with main_tabs[0]:
@@ -184,43 +274,44 @@ if 'members_df' in locals() and not members_df.empty:
                 if st.button("Fetch activity data"):
                     with st.spinner("Fetching member activities..."):
                         # Get activity data for the past 12 months
-                        twelve_months_ago = datetime.now() - timedelta(days=365)
+                        twelve_months_ago = (datetime.now() - timedelta(days=365)).replace(hour=0, minute=0, second=0, microsecond=0)
                         activities_data = fetch_subscription_activities(twelve_months_ago, debug_mode=debug_mode)
                         
                         # Process activity data if we have any
                         if activities_data:
                             activities_df = process_subscription_activities(activities_data)
                             st.session_state.activities_cache = activities_df
+                            st.session_state.activities_fetch_time = datetime.now()
                             st.rerun()
                         else:
                             st.error("Failed to fetch activity data. Please try again later.")
         
         # Member Growth visualization
         with main_tabs[1]:
-            display_membership_metrics(subs_df, members_data)
+            display_membership_metrics(subs_df, orders_df)
             st.divider()
             
-            # Pass activities data and members_data to show_member_growth if available
+            # Pass activities data and orders to show_member_growth if available
             if "activities_cache" in st.session_state and not st.session_state.activities_cache.empty:
-                show_member_growth(subs_df, st.session_state.activities_cache, members_data)
+                show_member_growth(subs_df, st.session_state.activities_cache, orders_df)
             else:
-                show_member_growth(subs_df, members_data=members_data)
+                show_member_growth(subs_df, orders_df=orders_df)
         
         # Combined Plans and Revenue visualization
         with main_tabs[2]:
-            show_plans_and_revenue(subs_df)
+            show_plans_and_revenue(subs_df, active_subs)
         
         # Education Members visualization (if available)
         if "is_education" in subs_df.columns:
             with main_tabs[3]:
-                show_education_members(subs_df, active_count)
+                show_education_members(subs_df, active_count, active_subs)
                 member_directory_tab_index = 4
         else:
             member_directory_tab_index = 3
             
         # Member Directory tab
         with main_tabs[member_directory_tab_index]:
-            show_member_directory(members_df, subs_df)
+            show_member_directory(subs_df)
             
 else:
     st.warning("No member data available. Please check your API connection.")
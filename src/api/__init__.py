@@ -2,6 +2,22 @@
 API client module for Maine Ad + Design membership dashboard
 """
 
-from .memberful import get_memberful_data, fetch_all_members, fetch_subscription_activities
+from .memberful import (
+    MEMBERS_PAGE_SIZE,
+    MEMBER_STATES,
+    get_memberful_data,
+    clear_response_cache,
+    fetch_members_page,
+    fetch_next_member_pages,
+    fetch_subscription_activities
+)
 
-__all__ = ["get_memberful_data", "fetch_all_members", "fetch_subscription_activities"]
\ No newline at end of file
+__all__ = [
+    "MEMBERS_PAGE_SIZE",
+    "MEMBER_STATES",
+    "get_memberful_data",
+    "clear_response_cache",
+    "fetch_members_page",
+    "fetch_next_member_pages",
+    "fetch_subscription_activities"
+]
@@ -4,7 +4,31 @@ Memberful API client for the Maine Ad + Design membership dashboard
 import os
 import requests
 import streamlit as st
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+# orjson parses the large member pages faster; fall back to the standard library without it
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Members and activities fetched per GraphQL request
+MEMBERS_PAGE_SIZE = 100
+ACTIVITIES_PAGE_SIZE = 100
+
+# Shared HTTP session so paginated requests reuse the same TLS connection
+SESSION = requests.Session()
+
+# Memberful only paginates by cursor, so the member list is split by state
+# into independent cursor chains that can be fetched side by side
+MEMBER_STATES = ("ACTIVE", "INACTIVE")
+
+class GraphQLError(Exception):
+    """A GraphQL response that reports errors and carries no data"""
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(error.get("message", str(error)) for error in errors))
 
 def get_memberful_data(query, variables=None, debug_mode=False):
     """Make a GraphQL request to the Memberful API"""
@@ -32,6 +56,32 @@ def get_memberful_data(query, variables=None, debug_mode=False):
         """)
         st.stop()
         
+    try:
+        return _post_graphql(query, variables or {}, api_key)
+    except requests.HTTPError as error:
+        st.error(f"Error from API: {error.response.status_code} - {error.response.text}")
+        return None
+    except GraphQLError as error:
+        st.error(f"GraphQL errors from API: {error}")
+        if debug_mode:
+            st.json(error.errors)
+        return None
+    except ValueError as error:
+        # Check if response is valid JSON
+        st.error("Invalid JSON response from API")
+        if debug_mode:
+            st.code(getattr(error, "doc", ""))
+        return None
+
+@st.cache_data(ttl=600, show_spinner=False)
+def _post_graphql(query, variables, api_key):
+    """
+    Send a GraphQL request and return the decoded JSON response
+    
+    Cached across sessions for 10 minutes, keyed on the query, variables and API key.
+    Failures raise instead of returning, so they are never cached: HTTP errors, invalid
+    JSON, and 200 responses whose GraphQL payload has errors but no data.
+    """
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
@@ -39,96 +89,145 @@ def get_memberful_data(query, variables=None, debug_mode=False):
     
     # Memberful GraphQL endpoint URL
     url = "https://made.memberful.com/api/graphql"
-    response = requests.post(
+    response = SESSION.post(
         url, 
-        json={"query": query, "variables": variables or {}},
+        json={"query": query, "variables": variables},
         headers=headers
     )
     
     if response.status_code != 200:
-        st.error(f"Error from API: {response.status_code} - {response.text}")
-        return None
+        raise requests.HTTPError(response=response)
     
-    # Check if response is valid JSON
-    try:
-        json_response = response.json()
-        return json_response
-    except ValueError:
-        st.error("Invalid JSON response from API")
-        if debug_mode:
-            st.code(response.text)
-        return None
+    # orjson's decode error is a ValueError too, so callers handle both parsers the same way
+    if orjson is not None:
+        result = orjson.loads(response.content)
+    else:
+        result = response.json()
+    
+    # GraphQL reports failed queries with a 200 status, so don't let them be cached
+    if isinstance(result, dict) and result.get("errors") and result.get("data") is None:
+        raise GraphQLError(result["errors"])
+    
+    return result
 
-def fetch_all_members(debug_mode=False):
-    """Fetch all members with their subscriptions and orders from the Memberful API"""
-    all_members = []
-    has_next_page = True
-    after_cursor = None
+def clear_response_cache():
+    """Drop cached API responses so the next requests go to Memberful"""
+    _post_graphql.clear()
+
+def fetch_members_page(after_cursor=None, debug_mode=False, state=None):
+    """
+    Fetch a single page of members with their subscriptions and orders
     
-    while has_next_page:
-        # Build pagination parameters
-        pagination = f'first: 100, after: "{after_cursor}"' if after_cursor else 'first: 100'
+    Args:
+        after_cursor (str, optional): Cursor of the previous page. Defaults to the first page.
+        debug_mode (bool, optional): Whether to print debug messages. Defaults to False.
+        state (str, optional): Only fetch ACTIVE or INACTIVE members. Defaults to all members.
         
-        # GraphQL query with pagination
-        paginated_query = f"""
-        query {{
-            members({pagination}) {{
-                pageInfo {{
-                    hasNextPage
-                    endCursor
-                }}
-                nodes {{
+    Returns:
+        tuple: (members, has_next_page, end_cursor), or None if the request failed
+    """
+    # Build pagination parameters
+    pagination = f'first: {MEMBERS_PAGE_SIZE}'
+    if after_cursor:
+        pagination += f', after: "{after_cursor}"'
+    if state:
+        pagination += f', state: {state}'
+    
+    # GraphQL query with pagination
+    paginated_query = f"""
+    query {{
+        members({pagination}) {{
+            pageInfo {{
+                hasNextPage
+                endCursor
+            }}
+            nodes {{
+                id
+                email
+                fullName
+                totalSpendCents
+                subscriptions {{
                     id
-                    email
-                    fullName
-                    totalSpendCents
-                    subscriptions {{
-                        id
-                        active
-                        autorenew
-                        createdAt
-                        expiresAt
-                        plan {{
-                            name
-                            priceCents
-                            intervalUnit
-                            intervalCount
-                        }}
+                    active
+                    autorenew
+                    createdAt
+                    expiresAt
+                    plan {{
+                        name
+                        priceCents
+                        intervalUnit
+                        intervalCount
                     }}
-                    orders {{
-                        totalCents
-                        createdAt
-                        status
-                        couponDiscountAmountCents
-                        coupon {{
-                            code
-                        }}
+                }}
+                orders {{
+                    totalCents
+                    createdAt
+                    status
+                    couponDiscountAmountCents
+                    coupon {{
+                        code
                     }}
                 }}
             }}
         }}
-        """
-        
-        # Make the API request
-        page_result = get_memberful_data(paginated_query, debug_mode=debug_mode)
-        
-        if not page_result or "data" not in page_result:
-            break
-            
-        # Extract member data
-        page_data = page_result.get("data", {}).get("members", {})
-        page_members = page_data.get("nodes", [])
-        all_members.extend(page_members)
+    }}
+    """
+    
+    # Make the API request
+    page_result = get_memberful_data(paginated_query, debug_mode=debug_mode)
+    
+    if not page_result or "data" not in page_result:
+        return None
         
-        # Update pagination info
-        page_info = page_data.get("pageInfo", {})
-        has_next_page = page_info.get("hasNextPage", False)
-        after_cursor = page_info.get("endCursor")
+    # Extract member data
+    page_data = page_result.get("data", {}).get("members", {})
+    page_members = page_data.get("nodes", [])
+    
+    # Extract pagination info
+    page_info = page_data.get("pageInfo", {})
+    has_next_page = page_info.get("hasNextPage", False)
+    end_cursor = page_info.get("endCursor")
+    
+    if debug_mode:
+        st.write(f"Fetched page with {len(page_members)} members. More pages: {has_next_page}")
+    
+    return page_members, has_next_page, end_cursor
+
+def fetch_next_member_pages(cursors, debug_mode=False):
+    """
+    Fetch the next page of each member state's cursor chain concurrently
+    
+    Args:
+        cursors (dict): Maps each member state to the cursor of its previous page, or None to start the chain
+        debug_mode (bool, optional): Whether to print debug messages. Defaults to False.
         
-        if debug_mode:
-            st.write(f"Fetched page with {len(page_members)} members. More pages: {has_next_page}")
+    Returns:
+        tuple: (members, cursors) with the new members and the cursors of the chains that have
+            more pages, or None if any request failed
+    """
+    if not cursors:
+        return [], {}
+    
+    # Worker threads need the script context so errors and debug output still render
+    ctx = get_script_run_ctx(suppress_warning=True)
+    with ThreadPoolExecutor(max_workers=len(cursors), initializer=add_script_run_ctx, initargs=(None, ctx)) as executor:
+        futures = {
+            state: executor.submit(fetch_members_page, cursor, debug_mode, state)
+            for state, cursor in cursors.items()
+        }
+        pages = {state: future.result() for state, future in futures.items()}
+    
+    if any(page is None for page in pages.values()):
+        return None
     
-    return all_members
+    members = []
+    next_cursors = {}
+    for state, (page_members, has_next_page, end_cursor) in pages.items():
+        members.extend(page_members)
+        if has_next_page:
+            next_cursors[state] = end_cursor
+    
+    return members, next_cursors
 
 def fetch_subscription_activities(start_date, end_date=None, debug_mode=False):
     """
@@ -149,22 +248,24 @@ def fetch_subscription_activities(start_date, end_date=None, debug_mode=False):
     has_next_page = True
     after_cursor = None
     
-    # Convert dates to Unix timestamps
+    # Convert dates to Unix timestamps; with no end date the range stays open up to now
     start_timestamp = int(start_date.timestamp())
-    end_timestamp = int(end_date.timestamp()) if end_date else int(datetime.now().timestamp())
+    end_timestamp = int(end_date.timestamp()) if end_date else None
     
     # Try fetching activities
     while has_next_page:
         # Build pagination parameters
-        pagination = f'first: 100, after: "{after_cursor}"' if after_cursor else 'first: 100'
+        pagination = f'first: {ACTIVITIES_PAGE_SIZE}, after: "{after_cursor}"' if after_cursor else f'first: {ACTIVITIES_PAGE_SIZE}'
         
-        # Build a more complete query for activities
-        # We'll do date filtering in Python code instead of GraphQL
+        # Let the API filter by date so out-of-range activities are never downloaded.
+        # Leaving out an open end keeps the query text stable, so cached responses can be reused.
+        date_range = f"gte: {start_timestamp}, lte: {end_timestamp}" if end_timestamp else f"gte: {start_timestamp}"
+        date_filter = f"createdAt: {{{date_range}}}"
         
-        # GraphQL query with only pagination
+        # GraphQL query with pagination and date range
         paginated_query = f"""
         query {{
-            activities({pagination}) {{
+            activities({pagination}, {date_filter}) {{
                 pageInfo {{
                     hasNextPage
                     endCursor
@@ -227,25 +328,7 @@ def fetch_subscription_activities(start_date, end_date=None, debug_mode=False):
         page_data = page_result.get("data", {}).get("activities", {})
         page_activities = page_data.get("nodes", [])
         
-        if debug_mode:
-            st.write(f"Received {len(page_activities)} activities in this page")
-            
-        # Filter activities by date since we couldn't do it in the query
-        filtered_activities = []
-        for activity in page_activities:
-            activity_time = activity.get("createdAt")
-            if activity_time:
-                # Convert to int if it's a string
-                if isinstance(activity_time, str) and activity_time.isdigit():
-                    activity_time = int(activity_time)
-                # Filter by date range
-                if start_timestamp <= activity_time <= end_timestamp:
-                    filtered_activities.append(activity)
-        
-        if debug_mode and len(filtered_activities) != len(page_activities):
-            st.write(f"Filtered from {len(page_activities)} to {len(filtered_activities)} activities in date range")
-            
-        all_activities.extend(filtered_activities)
+        all_activities.extend(page_activities)
         
         # Update pagination info
         page_info = page_data.get("pageInfo", {})
@@ -253,7 +336,7 @@ def fetch_subscription_activities(start_date, end_date=None, debug_mode=False):
         after_cursor = page_info.get("endCursor")
         
         if debug_mode:
-            st.write(f"Fetched page with {len(filtered_activities)} activities in date range. More pages: {has_next_page}")
+            st.write(f"Fetched page with {len(page_activities)} activities in date range. More pages: {has_next_page}")
     
     # If debug mode and we still have no activities, check schema to understand available field types
     if debug_mode:
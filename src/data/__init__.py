@@ -2,14 +2,14 @@
 Data processing module for the Maine Ad + Design membership dashboard
 """
 
-from .members import process_members_data, prepare_all_members_view, prepare_new_members, calculate_mrr
+from .members import process_members_data, prepare_new_members, calculate_mrr, flatten_orders
 from .activities import process_subscription_activities, calculate_monthly_mrr_changes
 
 __all__ = [
     "process_members_data", 
-    "prepare_all_members_view", 
     "prepare_new_members", 
     "calculate_mrr",
+    "flatten_orders",
     "process_subscription_activities",
     "calculate_monthly_mrr_changes"
 ]
\ No newline at end of file
@@ -1,9 +1,50 @@
 """
 Processing functions for member activities data
 """
+import numpy as np
 import pandas as pd
 from datetime import datetime
-import calendar
+
+# Flattened activity fields read by process_subscription_activities; missing ones are added empty
+ACTIVITY_SOURCE_COLUMNS = [
+    "id", "type", "createdAt", "member_id", "member_fullName", "member_email",
+    "subscription_id", "subscription_orders", "subscription_plan_name", "subscription_plan_priceCents",
+    "subscription_plan_intervalUnit", "subscription_plan_intervalCount"
+]
+
+# Email domains that mark an education member when no education coupon is found
+EDUCATION_EMAIL_DOMAINS = (".edu", "@meca.edu", "@maine.edu", "@usm.maine.edu", "@mcad.edu")
+
+# MRR direction and category for each activity type from a paying member.
+# Without old plan data, upgrades and downgrades use the full plan value as an approximation.
+ACTIVITY_RULES = {
+    "new_subscription": (1, "New members"),
+    "new_order": (1, "New members"),
+    "subscription_reactivated": (1, "Reactivations"),
+    "upgrade": (1, "Upgrades"),
+    "downgrade": (-1, "Downgrades"),
+    "subscription_deleted": (-1, "Cancellations"),
+    "subscription_deactivated": (-1, "Cancellations"),
+    "renewal_payment_failed": (-1, "Failed payments"),
+    "renewal": (0, "Renewals"),
+}
+
+# Category for each activity type from an education member, who adds no MRR
+EDUCATION_ACTIVITY_CATEGORIES = {
+    "new_subscription": "Education members",
+    "new_order": "Education members",
+    "renewal": "Education renewals",
+    "subscription_deactivated": "Education cancellations",
+}
+
+# Rows of each month in the MRR changes table, in display order
+MRR_CATEGORY_DTYPE = pd.CategoricalDtype([
+    "Starting MRR", "New members", "Reactivations", "Upgrades",
+    "Downgrades", "Cancellations", "Failed payments", "Total MRR"
+], ordered=True)
+
+# Categories whose monthly sums move MRR between the starting and total rows
+MRR_CHANGE_CATEGORIES = {"New members", "Reactivations", "Upgrades", "Downgrades", "Cancellations", "Failed payments"}
 
 def process_subscription_activities(activities_data):
     """
@@ -21,150 +62,98 @@ def process_subscription_activities(activities_data):
     if not activities_data:
         return pd.DataFrame()
     
-    # Create a dataframe for the activities
-    activity_records = []
+    # Flatten the nested activity JSON into columns such as member_email and subscription_plan_name
+    flat = pd.json_normalize(activities_data, sep="_").reindex(columns=ACTIVITY_SOURCE_COLUMNS)
+    activity_type = flat["type"]
+    has_subscription = flat["subscription_id"].notna()
+    
+    # Check by email domain (fallback method), as strings since the column is all-NaN floats without emails
+    is_education = flat["member_email"].astype("string").str.lower().str.endswith(EDUCATION_EMAIL_DOMAINS).fillna(False).astype(bool)
+    
+    # Check by coupon code (primary method), across every order of every activity at once
+    orders = flat["subscription_orders"].explode().dropna()
+    if not orders.empty:
+        coupon_codes = pd.json_normalize(orders.tolist(), sep="_").reindex(columns=["coupon_code"])["coupon_code"]
+        coupon_codes.index = orders.index
+        # Orders without coupons leave an all-NaN float column, so cast to strings before matching
+        has_education_coupon = coupon_codes.astype("string").str.lower().str.contains("education", regex=False, na=False).astype(bool)
+        is_education |= has_education_coupon.groupby(level=0).any().reindex(flat.index, fill_value=False)
+    
+    # Calculate monthly value for MRR calculations where the plan has a price and interval
+    plan_price_cents = pd.to_numeric(flat["subscription_plan_priceCents"], downcast="integer")
+    interval_unit = flat["subscription_plan_intervalUnit"]
+    interval_count = pd.to_numeric(flat["subscription_plan_intervalCount"], downcast="integer")
+    is_priced = has_subscription & plan_price_cents.notna() & interval_unit.notna()
+    monthly_multiplier = interval_unit.map({"week": 0.25, "year": 1/12}).fillna(1)
+    monthly_value = (plan_price_cents * monthly_multiplier / interval_count.fillna(1).replace(0, 1)).where(is_priced, 0)
+    
+    # Non-education members - look up financial impact based on activity type,
+    # counting any other failed payment type as a failed renewal
+    is_failed_payment = (
+        activity_type.str.contains("renewal_failed", regex=False, na=False)
+        | activity_type.str.contains("payment_failed", regex=False, na=False)
+    )
+    rule_type = activity_type.where(activity_type.isin(ACTIVITY_RULES.keys()) | ~is_failed_payment, "renewal_payment_failed")
+    direction = rule_type.map({name: rule[0] for name, rule in ACTIVITY_RULES.items()})
+    rule_category = rule_type.map({name: rule[1] for name, rule in ACTIVITY_RULES.items()})
+    
+    # Education members don't contribute to MRR
+    is_paying = is_priced & ~is_education & direction.notna()
+    mrr_impact = (direction * monthly_value).where(is_paying, 0)
+    
+    # Categorize each activity, handling activities without subscription data by type
+    category = np.select(
+        [
+            is_priced & is_education,
+            is_paying,
+            ~has_subscription & (activity_type == "free_signup"),
+            ~has_subscription & activity_type.str.contains("team_member", regex=False, na=False),
+            ~has_subscription & activity_type.str.contains("auto_renew", regex=False, na=False),
+        ],
+        [
+            activity_type.map(EDUCATION_ACTIVITY_CATEGORIES).fillna("Education changes"),
+            rule_category,
+            "Free signups",
+            "Team member changes",
+            "Subscription changes",
+        ],
+        default="Other"
+    )
+    
+    activities_df = pd.DataFrame({
+        "id": flat["id"],
+        "type": activity_type,
+        "category": category,
+        "created_at": flat["createdAt"].where(flat["createdAt"] != 0),
+        "member_id": flat["member_id"],
+        "member_name": flat["member_fullName"],
+        "member_email": flat["member_email"],
+        "subscription_id": flat["subscription_id"],
+        "is_education": is_education,
+        "mrr_impact_cents": mrr_impact,
+        "mrr_impact_dollars": mrr_impact / 100  # Convert cents to dollars
+    })
     
-    for activity in activities_data:
-        # Basic activity info
-        activity_type = activity.get("type")
-        created_at = activity.get("createdAt")
-        member_info = activity.get("member", {})
-        member_id = member_info.get("id")
-        member_name = member_info.get("fullName")
-        member_email = member_info.get("email")
-        
-        # Get subscription info if available
-        subscription_info = activity.get("subscription", {})
-        subscription_id = subscription_info.get("id") if subscription_info else None
-        
-        # Set defaults for financial calculations
-        mrr_impact = 0
-        monthly_value = 0
-        plan_name = None
-        plan_price_cents = None
-        interval_unit = None
-        interval_count = None
-        activity_category = "Other"
-        
-        # Check if member is an education member
-        is_education = False
-        
-        # Check by email domain (fallback method)
-        if member_email and member_email.lower().endswith((".edu", "@meca.edu", "@maine.edu", "@usm.maine.edu", "@mcad.edu")):
-            is_education = True
-            
-        # Check by coupon code (primary method)
-        if subscription_info and subscription_info.get("orders"):
-            for order in subscription_info.get("orders", []):
-                coupon = order.get("coupon")
-                if coupon and coupon.get("code") and "education" in coupon.get("code", "").lower():
-                    is_education = True
-                    break
-        
-        # Process subscription data if available
-        if subscription_info:
-            plan_data = subscription_info.get("plan", {})
-            plan_name = plan_data.get("name")
-            plan_price_cents = plan_data.get("priceCents")
-            interval_unit = plan_data.get("intervalUnit")
-            interval_count = plan_data.get("intervalCount", 1)
-            
-            # Calculate monthly value for MRR calculations
-            if plan_price_cents is not None and interval_unit is not None:
-                monthly_multiplier = 1
-                if interval_unit == "week":
-                    monthly_multiplier = 0.25
-                elif interval_unit == "year":
-                    monthly_multiplier = 1/12  # Convert yearly to monthly
-                    
-                monthly_value = plan_price_cents * monthly_multiplier / (interval_count or 1)
-                
-                # Education members don't contribute to MRR, set impact to 0
-                if is_education:
-                    mrr_impact = 0
-                    
-                    # Set category to education if it's a new membership or renewal
-                    if activity_type == "new_subscription" or activity_type == "new_order":
-                        activity_category = "Education members"
-                    elif activity_type == "renewal":
-                        activity_category = "Education renewals"
-                    elif activity_type == "subscription_deactivated":
-                        activity_category = "Education cancellations"
-                    else:
-                        activity_category = "Education changes"
-                else:
-                    # Non-education members - calculate financial impact based on activity type
-                    if activity_type == "new_subscription" or activity_type == "new_order":
-                        # New subscription adds the full monthly value
-                        mrr_impact = monthly_value
-                        activity_category = "New members"
-                    elif activity_type == "subscription_reactivated":
-                        # Reactivation adds the full monthly value
-                        mrr_impact = monthly_value
-                        activity_category = "Reactivations"
-                    elif activity_type == "upgrade":
-                        # Upgrade adds the difference between new and old plan (simplified)
-                        mrr_impact = monthly_value  # Without old plan data, this is approximate
-                        activity_category = "Upgrades"
-                    elif activity_type == "downgrade":
-                        # Downgrade (simplified without previous plan data)
-                        mrr_impact = -monthly_value  # Approximation
-                        activity_category = "Downgrades"
-                    elif activity_type == "subscription_deleted" or activity_type == "subscription_deactivated":
-                        # Cancellation removes the full monthly value
-                        mrr_impact = -monthly_value
-                        activity_category = "Cancellations"
-                    elif activity_type == "renewal_payment_failed" or "renewal_failed" in activity_type or "payment_failed" in activity_type:
-                        # Failed payment potentially removes the full monthly value
-                        mrr_impact = -monthly_value
-                        activity_category = "Failed payments"
-                    elif activity_type == "renewal":
-                        # Renewal is neutral for MRR calculation
-                        mrr_impact = 0
-                        activity_category = "Renewals"
-        
-        # Handle activities without subscription data
-        elif activity_type == "free_signup":
-            activity_category = "Free signups"
-        elif "team_member" in activity_type:
-            activity_category = "Team member changes"
-        elif "auto_renew" in activity_type:
-            activity_category = "Subscription changes"
-            
-        # Create a record for this activity
-        record = {
-            "id": activity.get("id"),
-            "type": activity_type,
-            "category": activity_category,
-            "created_at": datetime.fromtimestamp(created_at) if created_at else None,
-            "member_id": member_id,
-            "member_name": member_name,
-            "member_email": member_email,
-            "subscription_id": subscription_id,
-            "is_education": is_education,
-            "mrr_impact_cents": mrr_impact,
-            "mrr_impact_dollars": mrr_impact / 100 if mrr_impact else 0  # Convert cents to dollars
-        }
-        
-        # Add plan data if available
-        if subscription_info:
-            record.update({
-                "plan_name": plan_name,
-                "plan_price_cents": plan_price_cents,
-                "interval_unit": interval_unit,
-                "interval_count": interval_count,
-                "monthly_value": monthly_value
-            })
-        
-        activity_records.append(record)
+    # Add plan data if any activity has a subscription, leaving it empty for the rest
+    if has_subscription.any():
+        activities_df["plan_name"] = flat["subscription_plan_name"]
+        activities_df["plan_price_cents"] = plan_price_cents
+        activities_df["interval_unit"] = interval_unit
+        activities_df["interval_count"] = interval_count
+        activities_df["monthly_value"] = monthly_value.where(has_subscription)
     
-    # Create DataFrame and sort by created_at
-    activities_df = pd.DataFrame(activity_records)
+    # Activity types, categories and plan fields repeat across many rows, so store them as categories
+    for col in ["type", "category", "interval_unit", "plan_name"]:
+        if col in activities_df.columns:
+            activities_df[col] = activities_df[col].astype("category")
     
     if not activities_df.empty:
-        # Add month for grouping
+        # Convert Unix timestamps to datetime in one pass, as for subscriptions
+        activities_df["created_at"] = pd.to_datetime(activities_df["created_at"], unit="s")
+        
+        # Add month for grouping, deriving the month start from the same periods
         activities_df["month"] = activities_df["created_at"].dt.to_period("M")
-        activities_df["month_dt"] = activities_df["created_at"].dt.to_period("M").dt.to_timestamp()
+        activities_df["month_dt"] = activities_df["month"].dt.to_timestamp()
         activities_df["month_name"] = activities_df["month_dt"].dt.strftime("%b %Y")
     
     return activities_df
@@ -188,95 +177,37 @@ def calculate_monthly_mrr_changes(activities_df, start_date, end_date=None):
     if end_date is None:
         end_date = datetime.now()
     
-    # Generate a list of all months in the date range
-    months_range = []
-    current_date = start_date.replace(day=1)
-    
-    while current_date <= end_date:
-        months_range.append(current_date)
-        # Move to next month
-        if current_date.month == 12:
-            current_date = current_date.replace(year=current_date.year + 1, month=1)
-        else:
-            current_date = current_date.replace(month=current_date.month + 1)
+    # Generate the start of every month in the date range
+    month_starts = pd.date_range(pd.Timestamp(start_date).normalize().replace(day=1), end_date, freq="MS")
     
     # Create month periods for joining
-    month_periods = [pd.Period(m, freq='M') for m in months_range]
+    month_periods = month_starts.to_period("M")
     
     # Group activities by month and category to calculate MRR changes
-    mrr_changes = activities_df.groupby(["month", "category"])["mrr_impact_dollars"].sum().reset_index()
-    
-    # Create a month lookup table for easy reference
-    month_data = []
-    for month in month_periods:
-        month_start = month.to_timestamp()
-        month_end = month_start + pd.offsets.MonthEnd(0)
-        
-        # Calculate month label for display
-        month_label = month_start.strftime("%b %Y")
-        
-        month_data.append({
-            "month": month,
-            "month_dt": month_start,
-            "month_label": month_label,
-            "days_in_month": calendar.monthrange(month_start.year, month_start.month)[1]
-        })
+    mrr_changes = activities_df.groupby(["month", "category"], observed=True)["mrr_impact_dollars"].sum()
     
     # Create dataframe of all months
-    months_df = pd.DataFrame(month_data)
+    months_df = pd.DataFrame({
+        "month": month_periods,
+        "month_dt": month_starts,
+        "month_label": month_starts.strftime("%b %Y"),
+        "days_in_month": month_starts.days_in_month
+    })
     
     # Create a baseline table with all months and zero values for all categories
-    categories = ["Starting MRR", "New members", "Reactivations", "Upgrades", 
-                 "Downgrades", "Cancellations", "Failed payments", "Total MRR"]
-    
-    baseline = []
-    for _, row in months_df.iterrows():
-        for category in categories:
-            baseline.append({
-                "month": row["month"],
-                "month_dt": row["month_dt"],
-                "month_label": row["month_label"],
-                "category": category,
-                "mrr_impact_dollars": 0
-            })
+    categories = MRR_CATEGORY_DTYPE.categories
     
-    baseline_df = pd.DataFrame(baseline)
-    
-    # Merge to get a complete dataframe with all months and categories
-    if not mrr_changes.empty:
-        # Only merge if we have actual data
-        result = pd.merge(
-            baseline_df, 
-            mrr_changes,
-            on=["month", "category"],
-            how="left",
-            suffixes=("", "_actual")
-        )
-        
-        # Replace null values with zero
-        result["mrr_impact_dollars"] = result.apply(
-            lambda x: x.get("mrr_impact_dollars_actual", 0) if pd.notna(x.get("mrr_impact_dollars_actual")) else x["mrr_impact_dollars"],
-            axis=1
-        )
-        
-        # Drop the duplicate column
-        result = result.drop(columns=["mrr_impact_dollars_actual"])
-    else:
-        result = baseline_df
+    # Lay the actual changes over every month and category, with zero where nothing happened
+    all_months_and_categories = pd.MultiIndex.from_product([months_df["month"], categories], names=["month", "category"])
+    result = (
+        mrr_changes.reindex(all_months_and_categories, fill_value=0)
+        .reset_index()
+        .merge(months_df[["month", "month_dt", "month_label"]], on="month", how="left")
+    )[["month", "month_dt", "month_label", "category", "mrr_impact_dollars"]]
     
     # Sort by month and ensure categories are in the right order
-    result["category_order"] = result["category"].map({
-        "Starting MRR": 0,
-        "New members": 1, 
-        "Reactivations": 2,
-        "Upgrades": 3,
-        "Downgrades": 4,
-        "Cancellations": 5,
-        "Failed payments": 6,
-        "Total MRR": 7
-    })
-    
-    result = result.sort_values(["month_dt", "category_order"])
+    result["category"] = result["category"].astype(MRR_CATEGORY_DTYPE)
+    result = result.sort_values(["month_dt", "category"])
     
     # Calculate Starting MRR and Total MRR for each month
     months_sorted = months_df["month"].sort_values().tolist()
@@ -287,33 +218,22 @@ def calculate_monthly_mrr_changes(activities_df, start_date, end_date=None):
     
     print(f"DEBUG CALCULATE_MONTHLY_MRR_CHANGES: Using initial MRR: ${initial_mrr}")
     
-    for i, month in enumerate(months_sorted):
-        # Filter result to just this month's data
-        month_data = result[result["month"] == month]
-        
-        if i == 0:
-            # For the first month, set the starting value from external data
-            starting_mrr = initial_mrr
-        else:
-            # For subsequent months, the starting MRR is the total MRR from the previous month
-            prev_month = months_sorted[i-1]
-            starting_mrr = result.loc[
-                (result["month"] == prev_month) & 
-                (result["category"] == "Total MRR"), 
-                "mrr_impact_dollars"
-            ].iloc[0]
-        
-        # Update the Starting MRR for this month
-        result.loc[(result["month"] == month) & (result["category"] == "Starting MRR"), "mrr_impact_dollars"] = starting_mrr
-        
-        # Calculate the Total MRR for this month
-        total_mrr = starting_mrr + result.loc[
-            (result["month"] == month) & 
-            (result["category"].isin(["New members", "Reactivations", "Upgrades", "Downgrades", "Cancellations", "Failed payments"])), 
-            "mrr_impact_dollars"
-        ].sum()
-        
-        # Update the Total MRR for this month
-        result.loc[(result["month"] == month) & (result["category"] == "Total MRR"), "mrr_impact_dollars"] = total_mrr
+    # Net MRR change per month from the six change categories, in month order
+    monthly_change = (
+        result[result["category"].isin(MRR_CHANGE_CATEGORIES)]
+        .groupby("month")["mrr_impact_dollars"].sum()
+        .reindex(months_sorted, fill_value=0)
+    )
+    
+    # Each month ends at the running total and starts where the previous month ended
+    total_mrr = initial_mrr + monthly_change.cumsum()
+    starting_mrr = total_mrr.shift(1, fill_value=initial_mrr)
+    
+    # Write both back into the long-form rows (the zero baseline may still be integer)
+    result["mrr_impact_dollars"] = result["mrr_impact_dollars"].astype(float)
+    is_starting = result["category"] == "Starting MRR"
+    result.loc[is_starting, "mrr_impact_dollars"] = result.loc[is_starting, "month"].map(starting_mrr)
+    is_total = result["category"] == "Total MRR"
+    result.loc[is_total, "mrr_impact_dollars"] = result.loc[is_total, "month"].map(total_mrr)
     
     return result
\ No newline at end of file
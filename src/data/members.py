@@ -1,50 +1,81 @@
 """
 Member data processing functions
 """
+import numpy as np
 import pandas as pd
+import streamlit as st
+from collections import namedtuple
 from datetime import datetime, timedelta
-from ..utils.member_utils import is_education_member
+from ..utils.member_utils import classify_education
+
+# Length of each plan interval in months, for normalizing prices to a monthly value
+INTERVAL_MONTHS = {"month": 1, "week": 0.25, "year": 12}
+
+# Columns of the subscriptions dataframe built by process_members_data
+SUBSCRIPTION_COLUMNS = [
+    "subscription_id", "member_id", "member_name", "member_email", "active", "auto_renew",
+    "plan", "price_cents", "interval_unit", "interval_count", "created_at", "expires_at", "is_education"
+]
+
+# Flattened subscription fields and the subscriptions dataframe column each one becomes
+SUBSCRIPTION_SOURCE_COLUMNS = {
+    "id": "subscription_id",
+    "member_id": "member_id",
+    "member_fullName": "member_name",
+    "member_email": "member_email",
+    "active": "active",
+    "autorenew": "auto_renew",
+    "plan_name": "plan",
+    "plan_priceCents": "price_cents",
+    "plan_intervalUnit": "interval_unit",
+    "plan_intervalCount": "interval_count",
+    "createdAt": "created_at",
+    "expiresAt": "expires_at",
+}
+
+# Values used when a subscription or its plan leaves a field out
+SUBSCRIPTION_DEFAULTS = {
+    "active": False,
+    "auto_renew": False,
+    "plan": "Unknown",
+    "price_cents": 0,
+    "interval_unit": "",
+    "interval_count": 1,
+}
+
+# Order fields read from the flattened orders of every member
+ORDER_COLUMNS = ["status", "createdAt", "totalCents"]
+
+MrrResult = namedtuple("MrrResult", ["current_mrr", "paying_members_count", "active_count", "education_count"])
 
 def process_members_data(members_data):
     """Process raw members data into usable dataframes"""
-    # Create dataframes for analysis
-    members_df = pd.DataFrame([
-        {
-            "id": member["id"],
-            "email": member["email"],
-            "name": member["fullName"],
-            "total_spend_cents": member.get("totalSpendCents", 0),
-            "is_education": is_education_member(member)
-        }
-        for member in members_data
-    ])
-    
-    # Create subscriptions dataframe
-    subscriptions = []
-    for member in members_data:
-        member_id = member["id"]
-        member_name = member["fullName"]
-        member_email = member["email"]
-        is_edu = is_education_member(member)
-        
-        for sub in member.get("subscriptions", []):
-            subscriptions.append({
-                "subscription_id": sub["id"],
-                "member_id": member_id,
-                "member_name": member_name,
-                "member_email": member_email,
-                "active": sub.get("active", False),
-                "auto_renew": sub.get("autorenew", False),
-                "plan": sub.get("plan", {}).get("name", "Unknown"),
-                "price_cents": sub.get("plan", {}).get("priceCents", 0),
-                "interval_unit": sub.get("plan", {}).get("intervalUnit", ""),
-                "interval_count": sub.get("plan", {}).get("intervalCount", 1),
-                "created_at": sub.get("createdAt"),
-                "expires_at": sub.get("expiresAt"),
-                "is_education": is_edu
-            })
-    
-    subs_df = pd.DataFrame(subscriptions)
+    # Classify every member at once; both dataframes reuse the result
+    education_by_member = classify_education(members_data)
+    
+    # Create dataframes for analysis, one column list at a time
+    members_df = pd.DataFrame({
+        "id": [member["id"] for member in members_data],
+        "email": [member["email"] for member in members_data],
+        "name": [member["fullName"] for member in members_data],
+        "total_spend_cents": [member.get("totalSpendCents", 0) for member in members_data],
+        "is_education": [education_by_member[member["id"]] for member in members_data]
+    })
+    
+    # Flatten every member's subscriptions in one pass, tagging each row with its member
+    members_with_subs = [member for member in members_data if member.get("subscriptions")]
+    if members_with_subs:
+        subs_df = pd.json_normalize(
+            members_with_subs, record_path="subscriptions", meta=["id", "fullName", "email"],
+            meta_prefix="member_", sep="_"
+        ).reindex(columns=list(SUBSCRIPTION_SOURCE_COLUMNS))
+        subs_df = subs_df.rename(columns=SUBSCRIPTION_SOURCE_COLUMNS).fillna(SUBSCRIPTION_DEFAULTS)
+        subs_df["active"] = subs_df["active"].astype(bool)
+        subs_df["auto_renew"] = subs_df["auto_renew"].astype(bool)
+        subs_df["is_education"] = subs_df["member_id"].map(education_by_member).astype(bool)
+        subs_df = subs_df[SUBSCRIPTION_COLUMNS]
+    else:
+        subs_df = pd.DataFrame({column: [] for column in SUBSCRIPTION_COLUMNS})
     
     if not subs_df.empty:
         # Convert Unix timestamps to datetime
@@ -52,27 +83,54 @@ def process_members_data(members_data):
             if col in subs_df.columns:
                 # Convert Unix timestamp (seconds) to datetime
                 subs_df[col] = pd.to_datetime(subs_df[col], unit='s')
+        
+        # Only a handful of plan names repeat across every row, so store them as categories
+        subs_df["plan"] = subs_df["plan"].astype("category")
+        
+        # API IDs are strings; integer codes make dedupes and unique counts hash ints instead
+        subs_df["member_id_code"] = pd.factorize(subs_df["member_id"])[0].astype(np.int32)
+        subs_df["subscription_id_code"] = pd.factorize(subs_df["subscription_id"])[0].astype(np.int32)
+        
+        # Prices and interval counts are small integers; columns with gaps stay float
+        for col in ["price_cents", "interval_count"]:
+            subs_df[col] = pd.to_numeric(subs_df[col], downcast="integer")
+        
+        # Add monthly value column (in cents) for MRR calculations
+        # Unknown interval units have no monthly equivalent and become NaN
+        unit_divisor = subs_df["interval_unit"].map(INTERVAL_MONTHS).to_numpy(dtype=float)
+        interval_count = subs_df["interval_count"].fillna(1).replace(0, 1).to_numpy(dtype=float)
+        subs_df["monthly_value"] = subs_df["price_cents"].to_numpy(dtype=float) / (unit_divisor * interval_count)
     
     return members_df, subs_df
 
-def prepare_all_members_view(members_df, subs_df):
-    """Prepare data for the all members view"""
-    if subs_df.empty:
-        return pd.DataFrame()
-        
-    # Create a unique list of members with their subscription info
-    # Get latest subscription for each member to show current status
-    member_subs = subs_df.sort_values("created_at", ascending=False).drop_duplicates("member_id")
-    columns_to_include = ["member_id", "active", "plan", "subscription_id"]
-    
-    # Make sure is_education is included if it exists
-    if "is_education" in member_subs.columns:
-        columns_to_include.append("is_education")
+def earliest_subscription_rows(subs_df):
+    """
+    Find each member's earliest subscription in a single pass without sorting
+    
+    Args:
+        subs_df (pd.DataFrame): Subscriptions with member_id and created_at columns
         
-    all_members = pd.merge(members_df, member_subs[columns_to_include], 
-                         left_on="id", right_on="member_id", how="left")
-                         
-    return all_members
+    Returns:
+        np.ndarray: Positional row index of the earliest subscription for each member
+    """
+    # Map members to dense integer codes for this frame
+    codes, member_ids = pd.factorize(subs_df["member_id_code"])
+    
+    # Compare creation times as integers, pushing missing dates to the end
+    created_at = subs_df["created_at"].to_numpy(dtype="datetime64[ns]")
+    no_date = np.iinfo(np.int64).max
+    timestamps = np.where(np.isnat(created_at), no_date, created_at.view(np.int64))
+    
+    # Earliest timestamp per member
+    earliest = np.full(len(member_ids), no_date, dtype=np.int64)
+    np.minimum.at(earliest, codes, timestamps)
+    
+    # First row holding that timestamp per member
+    candidates = np.flatnonzero(timestamps == earliest[codes])
+    rows = np.full(len(member_ids), len(subs_df), dtype=np.int64)
+    np.minimum.at(rows, codes[candidates], candidates)
+    
+    return rows
     
 def prepare_new_members(subs_df, days=30):
     """Prepare data for the new members view"""
@@ -89,61 +147,88 @@ def prepare_new_members(subs_df, days=30):
     
     return unique_new
     
-def calculate_recent_orders(members_data, days=30):
-    """Calculate the total value of orders in the past N days"""
-    if not members_data:
-        return 0
-        
-    today = datetime.now()
-    cutoff_date = today - timedelta(days=days)
-    cutoff_timestamp = cutoff_date.timestamp()
+def flatten_orders(members_data):
+    """
+    Flatten every member's orders into one dataframe
     
-    total_cents = 0
-    for member in members_data:
-        for order in member.get("orders", []):
-            if order.get("status") == "completed" and order.get("createdAt", 0) >= cutoff_timestamp:
-                total_cents += order.get("totalCents", 0)
-    
-    return total_cents / 100  # Convert cents to dollars
-
-def calculate_mrr(subs_df):
-    """Calculate Monthly Recurring Revenue for active subscriptions"""
-    if subs_df.empty:
-        return 0, 0, 0, 0
+    Args:
+        members_data (list): Raw member data from the API
         
-    # Add monthly value column
-    subs_df["monthly_value"] = subs_df.apply(
-        lambda x: x["price_cents"] / 
-                (1 if x["interval_unit"] == "month" else
-                0.25 if x["interval_unit"] == "week" else
-                12 if x["interval_unit"] == "year" else 0) / 
-                (x["interval_count"] or 1),
-        axis=1
-    )
+    Returns:
+        pd.DataFrame: One row per order with status, createdAt and totalCents columns
+    """
+    members_with_orders = [member for member in members_data if member.get("orders")]
+    if not members_with_orders:
+        return pd.DataFrame({column: [] for column in ORDER_COLUMNS})
+    
+    # Orders missing a timestamp or total count as created at the epoch and free
+    orders = pd.json_normalize(members_with_orders, record_path="orders").reindex(columns=ORDER_COLUMNS)
+    return orders.fillna({"createdAt": 0, "totalCents": 0})
+    
+def completed_orders_total(orders, start_timestamp, end_timestamp=None):
+    """
+    Sum completed orders created within a time window
+    
+    Args:
+        orders (pd.DataFrame): Orders from flatten_orders
+        start_timestamp (float): Unix timestamp where the window starts, inclusive
+        end_timestamp (float, optional): Unix timestamp where the window ends, inclusive
+        
+    Returns:
+        float: Total order value in dollars
+    """
+    in_window = (orders["status"] == "completed") & (orders["createdAt"] >= start_timestamp)
+    if end_timestamp is not None:
+        in_window &= orders["createdAt"] <= end_timestamp
+    
+    return orders.loc[in_window, "totalCents"].sum() / 100  # Convert cents to dollars
     
-    # For MRR calculation, filter out education members if the column exists
+def snapshot_arrays(subs_df):
+    """Extract the subscription columns used by mrr_snapshot as NumPy arrays"""
     if "is_education" in subs_df.columns:
-        # Filter out education members from MRR calculation
-        mrr_subs = subs_df[(subs_df["active"] == True) & (subs_df["is_education"] == False)]
+        is_education = subs_df["is_education"].to_numpy(dtype=bool)
     else:
-        mrr_subs = subs_df[subs_df["active"] == True]
-    
-    # Get the unique subscription IDs to avoid double-counting members
-    unique_subs = mrr_subs.drop_duplicates("subscription_id")
-    current_mrr = unique_subs["monthly_value"].sum() / 100  # Convert cents to dollars
-    
-    # Count paying members (unique subscription IDs to avoid counting group members)
-    paying_members_count = len(unique_subs)
+        is_education = np.zeros(len(subs_df), dtype=bool)
+        
+    return (
+        subs_df["monthly_value"].to_numpy(dtype=float),
+        is_education,
+        subs_df["subscription_id_code"].to_numpy(),
+        subs_df["member_id_code"].to_numpy()
+    )
+
+def mrr_snapshot(active_mask, monthly_value, is_education, sub_ids, member_ids):
+    """
+    Calculate MRR and member counts for the subscriptions selected by a mask
+    
+    Args:
+        active_mask (np.ndarray): Boolean mask of subscriptions active in the snapshot
+        monthly_value (np.ndarray): Monthly value of each subscription in cents
+        is_education (np.ndarray): Education flag of each subscription
+        sub_ids (np.ndarray): Subscription ID (or ID code) of each row
+        member_ids (np.ndarray): Member ID (or ID code) of each row
+        
+    Returns:
+        MrrResult: MRR in dollars plus paying, active and education member counts
+    """
+    # Education members don't contribute to MRR
+    paying_mask = active_mask & ~is_education
     
-    # Calculate Active Members (including education)
-    active_members = subs_df[subs_df["active"] == True]
-    active_count = len(active_members.drop_duplicates("member_id"))
+    # Count each subscription once to avoid double-counting group members
+    _, first_rows = np.unique(sub_ids[paying_mask], return_index=True)
+    current_mrr = np.nansum(monthly_value[paying_mask][first_rows]) / 100  # Convert cents to dollars
     
-    # Calculate education members if the column exists
-    if "is_education" in subs_df.columns:
-        education_members = subs_df[(subs_df["active"] == True) & (subs_df["is_education"] == True)]
-        education_count = len(education_members.drop_duplicates("member_id"))
-    else:
-        education_count = 0
+    # Count unique members, including education members
+    active_count = len(np.unique(member_ids[active_mask]))
+    education_count = len(np.unique(member_ids[active_mask & is_education]))
     
-    return current_mrr, paying_members_count, active_count, education_count
\ No newline at end of file
+    return MrrResult(current_mrr, len(first_rows), active_count, education_count)
+
+@st.cache_data(ttl=24 * 60 * 60, show_spinner=False)
+def calculate_mrr(subs_df):
+    """Calculate Monthly Recurring Revenue for active subscriptions"""
+    if subs_df.empty:
+        return MrrResult(0, 0, 0, 0)
+        
+    active_mask = subs_df["active"].to_numpy(dtype=bool)
+    return mrr_snapshot(active_mask, *snapshot_arrays(subs_df))
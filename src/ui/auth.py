@@ -3,25 +3,31 @@ Authentication components for the dashboard
 """
 import streamlit as st
 import hashlib
+import hmac
 import os
 
-def check_password():
-    """Verify the user password or query string bypass"""
+def _password_matches(candidate):
+    """Compare a submitted password with the dashboard password by SHA-256 digest"""
     # Get password from secrets
     correct_password = st.secrets.get("DASHBOARD_PASSWORD", "CongressStreet")
-    hashed_password = hashlib.sha256(correct_password.encode()).hexdigest()
-    
+    return hmac.compare_digest(
+        hashlib.sha256(candidate.encode()).digest(),
+        hashlib.sha256(correct_password.encode()).digest()
+    )
+
+def check_password():
+    """Verify the user password or query string bypass"""
     # Check for query string parameter first
     if "pass" in st.query_params:
         query_password = st.query_params["pass"]
-        if hashlib.sha256(query_password.encode()).hexdigest() == hashed_password:
+        if _password_matches(query_password):
             st.session_state["authenticated"] = True
             # Remove password from URL to prevent accidental sharing
             st.query_params.clear()
             return True
     
-    # If already authenticated, don't show login again
-    if "authenticated" in st.session_state and st.session_state["authenticated"]:
+    # If already authenticated, don't show login again (nothing is hashed without a query password)
+    if st.session_state.get("authenticated"):
         return True
     
     # Show login form
@@ -29,7 +35,7 @@ def check_password():
     password = st.text_input("Enter dashboard password", type="password")
     
     if st.button("Login"):
-        if hashlib.sha256(password.encode()).hexdigest() == hashed_password:
+        if _password_matches(password):
             st.session_state["authenticated"] = True
             st.rerun()
         else:
@@ -1,71 +1,83 @@
 """
 Member directory component for the dashboard
 """
-import pandas as pd
 import streamlit as st
-from ..data.members import prepare_all_members_view
+from ..data.members import earliest_subscription_rows
 
-def show_member_directory(members_df, subs_df):
-    """Display the member directory with filterable columns"""
-    # Store member data in session state if not already there
-    if "all_members_cache" not in st.session_state and not subs_df.empty:
-        # Create a unique list of members with their subscription info
-        all_members = prepare_all_members_view(members_df, subs_df)
-        st.session_state.all_members_cache = all_members
-        
-        # Also cache available plans
-        st.session_state.available_plans = subs_df["plan"].unique().tolist()
+# Directory table layouts, built once at import instead of on every rerun
+_BASE_COLS = ["name", "email", "joined_date", "plan", "active", "memberful_url"]
+_EDU_COLS = ["name", "email", "joined_date", "plan", "active", "is_education", "memberful_url"]
+
+_BASE_CFG = {
+    "name": "Member Name",
+    "email": "Email",
+    "joined_date": st.column_config.DatetimeColumn("Joined", format="MMM DD, YYYY"),
+    "plan": "Membership Plan",
+    "active": st.column_config.CheckboxColumn("Active"),
+    "memberful_url": st.column_config.LinkColumn("Memberful Profile")
+}
+_EDU_CFG = {
+    **_BASE_CFG,
+    "is_education": st.column_config.CheckboxColumn("Education Member")
+}
+
+@st.cache_data(ttl=24 * 60 * 60, show_spinner=False)
+def _consolidated_members(subs_df):
+    """
+    Build one directory row per member from their earliest subscription
+    
+    Cached on the contents of subs_df, so fresh data rebuilds it automatically.
+    
+    Args:
+        subs_df (pd.DataFrame): Processed subscriptions
         
+    Returns:
+        pd.DataFrame: Members with their join date and profile link, newest first
+    """
+    # Create a joined date column for members by getting their earliest subscription date
+    cols = ["member_id", "member_name", "member_email", "created_at", "plan", "active"]
+    if "is_education" in subs_df.columns:
+        cols.append("is_education")
+    # Gather only the needed columns for the selected rows in one step
+    members_with_joined = subs_df.iloc[earliest_subscription_rows(subs_df), subs_df.columns.get_indexer(cols)]
+    members_with_joined.rename(columns={"member_name": "name", "member_email": "email", "created_at": "joined_date"}, inplace=True)
+    
+    # Create a column for the Memberful profile URL
+    members_with_joined["memberful_url"] = "https://made.memberful.com/admin/members/" + members_with_joined["member_id"].astype(str)
+    
+    # Sort once here so reruns can slice the cached view directly
+    return members_with_joined.sort_values("joined_date", ascending=False).reset_index(drop=True)
+
+@st.fragment
+def show_member_directory(subs_df):
+    """
+    Display the member directory with filterable columns
+    
+    Runs as a fragment so moving the rows slider or show-all toggle only reruns this table.
+    """
     # Simplified consolidated member directory
     if not subs_df.empty:
-        # Get member subscription data with join dates
-        # Get all subscriptions to show each member's join date
-        if "consolidated_members_cache" not in st.session_state:
-            # Create a joined date column for members by getting their earliest subscription date
-            members_with_joined = subs_df.sort_values("created_at").drop_duplicates("member_id")
-            members_with_joined = members_with_joined[["member_id", "member_name", "member_email", "created_at", 
-                                                      "plan", "active", "is_education" if "is_education" in subs_df.columns else None]].dropna(axis=1)
-            members_with_joined.rename(columns={"member_name": "name", "member_email": "email", "created_at": "joined_date"}, inplace=True)
-            st.session_state.consolidated_members_cache = members_with_joined
-        
-        # Get the cached member data
-        consolidated_members = st.session_state.get("consolidated_members_cache", pd.DataFrame())
-        
-        # Apply filters to the cached data (client-side filtering)
-        filtered_members = consolidated_members.copy()
-        
-        # Create a column for the Memberful profile URL
-        filtered_members["memberful_url"] = filtered_members["member_id"].apply(
-            lambda id: f"https://made.memberful.com/admin/members/{id}"
-        )
+        # Get the member data with join dates, already sorted newest first
+        consolidated_members = _consolidated_members(subs_df)
         
         # Set up display columns with join date
-        if "is_education" in filtered_members.columns:
-            display_cols = ["name", "email", "joined_date", "plan", "active", "is_education", "memberful_url"]
-            column_config = {
-                "name": "Member Name",
-                "email": "Email",
-                "joined_date": st.column_config.DatetimeColumn("Joined", format="MMM DD, YYYY"),
-                "plan": "Membership Plan",
-                "active": st.column_config.CheckboxColumn("Active"),
-                "is_education": st.column_config.CheckboxColumn("Education Member"),
-                "memberful_url": st.column_config.LinkColumn("Memberful Profile")
-            }
-        else:
-            display_cols = ["name", "email", "joined_date", "plan", "active", "memberful_url"]
-            column_config = {
-                "name": "Member Name",
-                "email": "Email", 
-                "joined_date": st.column_config.DatetimeColumn("Joined", format="MMM DD, YYYY"),
-                "plan": "Membership Plan",
-                "active": st.column_config.CheckboxColumn("Active"),
-                "memberful_url": st.column_config.LinkColumn("Memberful Profile")
-            }
+        has_edu = "is_education" in consolidated_members.columns
+        display_cols, column_config = (_EDU_COLS, _EDU_CFG) if has_edu else (_BASE_COLS, _BASE_CFG)
+        
+        # Limit how many rows are serialized to the browser on each rerun, unless all are asked for
+        show_all = st.checkbox("Show all members")
+        page_size = st.slider("Rows to show", min_value=50, max_value=1000, value=200, step=50, disabled=show_all)
+        sorted_members = consolidated_members[display_cols]
+        shown_members = sorted_members if show_all else sorted_members.iloc[:page_size]
         
-        # Display the complete member table with sorting capability
+        # Display the member table with sorting capability
         st.dataframe(
-            filtered_members[display_cols].sort_values("joined_date", ascending=False),
+            shown_members,
             column_config=column_config,
             hide_index=True,
-            height=600
-        )
\ No newline at end of file
+            height=600,
+            width="stretch"
+        )
+        
+        if len(sorted_members) > len(shown_members):
+            st.caption(f"Showing the {page_size} most recently joined of {len(sorted_members)} members")
\ No newline at end of file
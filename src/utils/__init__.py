@@ -3,13 +3,17 @@ Utility functions for the Maine Ad + Design membership dashboard
 """
 
 from .date_utils import get_date_n_months_ago
-from .member_utils import is_education_member
+from .member_utils import classify_education
 from .ui_utils import create_download_button
 from .data_utils import clean_period_data
+from .cache_utils import save_data_cache, load_data_cache, clear_data_cache
 
 __all__ = [
     "get_date_n_months_ago", 
-    "is_education_member", 
+    "classify_education",
     "create_download_button",
-    "clean_period_data"
+    "clean_period_data",
+    "save_data_cache",
+    "load_data_cache",
+    "clear_data_cache"
 ]
\ No newline at end of file
@@ -0,0 +1,74 @@
+"""
+On-disk cache for fetched member data, so a process restart doesn't force a full API re-fetch
+"""
+import json
+import pathlib
+import pickle
+import pandas as pd
+from datetime import datetime
+
+CACHE_DIR = pathlib.Path(".cache")
+
+# Bump when process_members_data changes its output columns, so older caches are ignored
+CACHE_FORMAT = 2
+
+_MEMBERS_DATA_FILE = CACHE_DIR / "members_data.json"
+_MEMBERS_DF_FILE = CACHE_DIR / "members_df.pkl"
+_SUBS_DF_FILE = CACHE_DIR / "subs_df.pkl"
+_FETCH_TIME_FILE = CACHE_DIR / "last_fetch_time.json"
+
+def save_data_cache(members_data, members_df, subs_df, fetch_time):
+    """
+    Write fetched member data to the on-disk cache
+
+    DataFrames are pickled rather than re-processed from JSON so dtypes
+    (datetimes, booleans) come back exactly as process_members_data left them.
+
+    Args:
+        members_data (list): Raw member data from the API
+        members_df (pd.DataFrame): Processed members
+        subs_df (pd.DataFrame): Processed subscriptions
+        fetch_time (datetime): When the data was fetched
+    """
+    try:
+        CACHE_DIR.mkdir(exist_ok=True)
+        _MEMBERS_DATA_FILE.write_text(json.dumps(members_data))
+        members_df.to_pickle(_MEMBERS_DF_FILE)
+        subs_df.to_pickle(_SUBS_DF_FILE)
+        # Written last, so a partial write never looks like a valid cache
+        _FETCH_TIME_FILE.write_text(json.dumps({"last_fetch_time": fetch_time.isoformat(), "format": CACHE_FORMAT}))
+    except OSError:
+        # A read-only filesystem just means no disk cache
+        pass
+
+def load_data_cache(max_age_seconds):
+    """
+    Load member data from the on-disk cache if it is fresh enough
+
+    Args:
+        max_age_seconds (int): Maximum age of the cached data
+
+    Returns:
+        tuple: (members_data, members_df, subs_df, fetch_time), or None if the cache is missing or stale
+    """
+    try:
+        cache_info = json.loads(_FETCH_TIME_FILE.read_text())
+        if cache_info.get("format") != CACHE_FORMAT:
+            return None
+
+        fetch_time = datetime.fromisoformat(cache_info["last_fetch_time"])
+        if (datetime.now() - fetch_time).total_seconds() > max_age_seconds:
+            return None
+
+        members_data = json.loads(_MEMBERS_DATA_FILE.read_text())
+        members_df = pd.read_pickle(_MEMBERS_DF_FILE)
+        subs_df = pd.read_pickle(_SUBS_DF_FILE)
+    except (OSError, ValueError, KeyError, EOFError, pickle.UnpicklingError):
+        return None
+
+    return members_data, members_df, subs_df, fetch_time
+
+def clear_data_cache():
+    """Delete the on-disk cache so the next load fetches from the API"""
+    for path in (_FETCH_TIME_FILE, _MEMBERS_DATA_FILE, _MEMBERS_DF_FILE, _SUBS_DF_FILE):
+        path.unlink(missing_ok=True)
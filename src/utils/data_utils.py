@@ -8,20 +8,12 @@ def clean_period_data(period_df, period_column="month", sort_key_column="sort_ke
     # Convert Period to string 
     period_df[f"{period_column}_str"] = period_df[period_column].astype(str)
     
-    # Extract year and month for proper sorting
-    def extract_ym(period_str):
-        # Period strings are in format 'YYYY-MM'
-        if pd.isna(period_str) or not isinstance(period_str, str):
-            return None
-        parts = period_str.split('-')
-        if len(parts) == 2:
-            try:
-                return int(parts[0]) * 100 + int(parts[1])
-            except (ValueError, IndexError):
-                return None
-        return None
-        
-    period_df[sort_key_column] = period_df[f"{period_column}_str"].apply(extract_ym)
+    # Build a year and month sort key (e.g. 202403) from the periods themselves,
+    # parsing 'YYYY-MM' strings first when the column isn't already periods
+    periods = period_df[period_column]
+    if not isinstance(periods.dtype, pd.PeriodDtype):
+        periods = pd.to_datetime(periods.astype(str), format="%Y-%m", errors="coerce").dt.to_period("M")
+    period_df[sort_key_column] = (periods.dt.year * 100 + periods.dt.month).where(periods.notna())
     
     # Filter out rows with invalid sort keys
     period_df = period_df[period_df[sort_key_column].notna()]
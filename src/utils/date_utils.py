@@ -2,10 +2,10 @@
 Date utility functions
 """
 from datetime import datetime
+from dateutil.relativedelta import relativedelta
 
 def get_date_n_months_ago(n):
     """Get date n months ago from today"""
-    today = datetime.now()
-    n_months_ago = today.replace(month=today.month - n) if today.month > n else \
-                  today.replace(year=today.year - 1, month=today.month + 12 - n)
+    # relativedelta rolls back across years and clamps to the last day of shorter months
+    n_months_ago = datetime.now() - relativedelta(months=n)
     return n_months_ago.strftime("%Y-%m-%d")
\ No newline at end of file
@@ -1,22 +1,37 @@
 """
 Member utility functions
 """
+import pandas as pd
 
-def is_education_member(member):
-    """Check if a member is an education member based on their most recent order"""
-    orders = member.get("orders", [])
-    if not orders:
-        return False
+def classify_education(members_data):
+    """
+    Classify every member as education or not in one pass over all orders
     
-    # Sort orders by creation time (newest first)
-    sorted_orders = sorted(orders, key=lambda o: o.get("createdAt", 0), reverse=True)
-    most_recent_order = sorted_orders[0]
+    A member is an education member when their most recent order was free
+    and used the Education coupon.
     
-    # Check if the most recent order was free and used the Education coupon
-    is_free = most_recent_order.get("totalCents", 0) == 0
-    has_education_coupon = False
+    Args:
+        members_data (list): Raw member data from the API
+        
+    Returns:
+        dict: Education flag for each member ID
+    """
+    is_education = dict.fromkeys((member["id"] for member in members_data), False)
+    
+    members_with_orders = [member for member in members_data if member.get("orders")]
+    if not members_with_orders:
+        return is_education
+    
+    # Flatten every order, tagged with its member
+    orders = pd.json_normalize(
+        members_with_orders, record_path="orders", meta=["id"], meta_prefix="member_", sep="_"
+    ).reindex(columns=["member_id", "createdAt", "totalCents", "coupon_code"])
     
-    if most_recent_order.get("coupon") and most_recent_order["coupon"].get("code") == "Education":
-        has_education_coupon = True
+    # Most recent order per member; ties keep the earliest listed order
+    latest = orders.loc[orders["createdAt"].fillna(0).groupby(orders["member_id"], sort=False).idxmax()]
+    
+    # Check if the most recent order was free and used the Education coupon
+    latest_is_education = (latest["totalCents"].fillna(0) == 0) & (latest["coupon_code"] == "Education")
+    is_education.update(zip(latest["member_id"], latest_is_education.tolist()))
     
-    return is_free and has_education_coupon
\ No newline at end of file
+    return is_education
\ No newline at end of file
@@ -3,9 +3,14 @@ UI utility functions
 """
 import streamlit as st
 
+@st.cache_data(show_spinner=False)
+def _csv_bytes(df):
+    """Serialize a dataframe to CSV bytes, reused across reruns while the dataframe is unchanged"""
+    return df.to_csv(index=False).encode("utf-8")
+
 def create_download_button(df, filename, button_text="Download as CSV"):
     """Create a download button for a dataframe"""
-    csv = df.to_csv(index=False)
+    csv = _csv_bytes(df)
     st.download_button(
         label=button_text,
         data=csv,
@@ -1,195 +1,172 @@
 """
 Member activities visualization functions
 """
+import numpy as np
 import pandas as pd
 import streamlit as st
 
-def show_member_activities(activities_df):
+# Display label for each activity type; other types fall back to a title-cased type
+ACTIVITY_LABELS = {
+    "new_order": "New subscription",
+    "new_subscription": "New subscription",
+    "subscription_deactivated": "Subscription deactivated",
+    "subscription_reactivated": "Subscription reactivated",
+    "free_signup": "Free signup",
+    "renewal": "Subscription renewed",
+    "upgrade": "Plan upgraded",
+    "downgrade": "Plan downgraded",
+    "auto_renew_disabled": "Auto-renewal disabled",
+    "team_member_deleted": "Team member removed",
+    "new_team_member": "New team member added",
+}
+
+# Define emoji for different activity types
+ACTIVITY_EMOJIS = {
+    "New subscription": "🟢",
+    "Subscription renewed": "🔄",
+    "Free signup": "🔵",
+    "Subscription deactivated": "🔴",
+    "Auto-renewal disabled": "🟠",
+    "Team member removed": "👤❌",
+    "New team member added": "👤➕",
+    "Renewal failed": "⚠️",
+    "Plan upgraded": "⬆️",
+    "Plan downgraded": "⬇️",
+    "Education members": "🎓",
+    "Education renewals": "🎓",
+    "Education cancellations": "🎓",
+    "Education changes": "🎓"
+}
+
+# Default emoji for other activities
+DEFAULT_EMOJI = "ℹ️"
+
+def _format_feed_rows(page_activities):
     """
-    Display recent member activities in reverse chronological order with pagination and filtering
+    Add the display columns used by the activity feed
     
     Args:
-        activities_df (pd.DataFrame): DataFrame of processed activities
+        page_activities (pd.DataFrame): Labelled activities on the current page
+        
+    Returns:
+        pd.DataFrame: The same activities with emoji, timestamp and description columns
     """
-    if activities_df.empty:
-        st.info("No activity data available to display")
-        return
-    
-    st.subheader("Recent membership activities")
-    
-    # Helper function to format activity types nicely
-    def format_activity_type(activity_type):
-        if activity_type == "new_order" or activity_type == "new_subscription":
-            return "New subscription"
-        elif activity_type == "subscription_deactivated":
-            return "Subscription deactivated"
-        elif activity_type == "subscription_reactivated":
-            return "Subscription reactivated"
-        elif activity_type == "free_signup":
-            return "Free signup"
-        elif "renewal" in activity_type and "failed" in activity_type:
-            return "Renewal failed"
-        elif activity_type == "renewal":
-            return "Subscription renewed"
-        elif activity_type == "upgrade":
-            return "Plan upgraded"
-        elif activity_type == "downgrade":
-            return "Plan downgraded"
-        elif activity_type == "auto_renew_disabled":
-            return "Auto-renewal disabled"
-        elif activity_type == "team_member_deleted":
-            return "Team member removed"
-        elif activity_type == "new_team_member":
-            return "New team member added"
-        else:
-            return activity_type.replace("_", " ").title()
-    
-    # Define emoji for different activity types
-    activity_emojis = {
-        "New subscription": "🟢",
-        "Subscription renewed": "🔄",
-        "Free signup": "🔵",
-        "Subscription deactivated": "🔴",
-        "Auto-renewal disabled": "🟠",
-        "Team member removed": "👤❌",
-        "New team member added": "👤➕",
-        "Renewal failed": "⚠️",
-        "Plan upgraded": "⬆️",
-        "Plan downgraded": "⬇️",
-        "Education members": "🎓",
-        "Education renewals": "🎓",
-        "Education cancellations": "🎓",
-        "Education changes": "🎓"
-    }
-    
-    # Default emoji for other activities
-    default_emoji = "ℹ️"
-    
-    # Number of activities to show per page
-    page_size = 50
-    
-    # Create a copy of the activities dataframe to avoid modifying the original
-    display_activities = activities_df.copy()
+    page_activities = page_activities.copy()
     
     # Format the timestamp for display
-    display_activities["timestamp"] = display_activities["created_at"].dt.strftime("%b %d %I:%M %p")
+    page_activities["timestamp"] = page_activities["created_at"].dt.strftime("%b %d %I:%M %p")
     
     # Create columns for the display
-    display_activities["member_name"] = display_activities["member_name"].fillna("Unknown")
-    
-    # Format activity types
-    display_activities["activity"] = display_activities["type"].apply(format_activity_type)
+    page_activities["member_name"] = page_activities["member_name"].fillna("Unknown")
     
     # Add emoji to each activity, with special emoji for education members
-    def get_activity_emoji(row):
-        activity = row["activity"]
-        is_education = row.get("is_education", False)
-        
-        # Use education emoji for education members
-        if is_education:
-            if "New subscription" in activity or "new_order" in activity:
-                return "🎓"
-            elif "Subscription renewed" in activity:
-                return "🎓"
-            elif "Subscription deactivated" in activity:
-                return "🎓❌"
-            else:
-                return "🎓"
-        
-        # Regular emoji for non-education members
-        return activity_emojis.get(activity, default_emoji)
-        
-    display_activities["emoji"] = display_activities.apply(get_activity_emoji, axis=1)
+    activity = page_activities["activity"]
+    is_education = page_activities.get("is_education", pd.Series(False, index=page_activities.index))
+    is_education = is_education.fillna(False).astype(bool)
+    page_activities["emoji"] = np.select(
+        [is_education & activity.str.contains("Subscription deactivated", regex=False), is_education],
+        ["🎓❌", "🎓"],
+        default=activity.map(ACTIVITY_EMOJIS).fillna(DEFAULT_EMOJI).to_numpy()
+    )
     
     # Make sure required plan columns exist
     for col in ["plan_name", "plan_price_cents", "interval_unit", "interval_count"]:
-        if col not in display_activities.columns:
-            display_activities[col] = None
+        if col not in page_activities.columns:
+            page_activities[col] = None
     
     # Add memberful profile link
-    display_activities["memberful_url"] = display_activities["member_id"].apply(
-        lambda id: f"https://made.memberful.com/admin/members/{id}" if pd.notna(id) else None
+    member_id = page_activities["member_id"]
+    page_activities["memberful_url"] = ("https://made.memberful.com/admin/members/" + member_id.astype(str)).where(member_id.notna())
+    
+    # Format plan details in a compact way, e.g. "Individual membership ($60/year)"
+    plan_name = page_activities["plan_name"]
+    price_cents = pd.to_numeric(page_activities["plan_price_cents"])
+    has_plan = plan_name.notna() & price_cents.notna()
+    price = np.round(price_cents.fillna(0) / 100).astype("int64").astype(str)
+    interval = page_activities["interval_unit"].astype(object).fillna("month").astype(str)
+    interval_count = page_activities["interval_count"].fillna(1)
+    per_interval = np.where(interval_count > 1, "/" + interval_count.astype(str) + " " + interval + "s", "/" + interval)
+    page_activities["plan_details"] = np.where(has_plan, plan_name.astype(str) + " ($" + price + per_interval + ")", "")
+    
+    # Make names links where we have a member URL
+    name = page_activities["member_name"]
+    url = page_activities["memberful_url"]
+    name = name.where(url.isna(), "[" + name + "](" + url + ")")
+    
+    # Education plans are free, so swap the price for an education note
+    plan = page_activities["plan_details"]
+    education_plan = plan.str.split(" ($", regex=False).str[0] + " (Free - Education membership)"
+    plan = plan.where(~is_education | (plan == ""), education_plan)
+    
+    # Create a compact description for each activity, checking the same phrases in the
+    # same order for every member; team, signup and plan wording only applies to regular members
+    activity_lower = activity.str.lower()
+    
+    def mentions(phrase):
+        return activity_lower.str.contains(phrase, regex=False)
+    
+    is_upgrade = mentions("upgrade")
+    is_downgrade = mentions("downgrade")
+    is_team_change = ~is_education & mentions("team member")
+    is_plan_change = ~is_education & mentions("plan")
+    page_activities["compact_description"] = np.select(
+        [
+            mentions("new subscription") | mentions("new order"),
+            mentions("renewed"),
+            mentions("deactivated"),
+            mentions("disabled"),
+            is_education & (is_upgrade | is_downgrade),
+            is_team_change & mentions("added"),
+            is_team_change,
+            ~is_education & mentions("free signup"),
+            is_plan_change & is_upgrade,
+            is_plan_change & is_downgrade,
+        ],
+        [
+            name + " joined with " + plan,
+            name + " renewed " + plan,
+            name + " cancelled " + plan,
+            name + " disabled auto-renewal for " + plan,
+            name + " changed plan to " + plan,
+            name + " was added as a team member",
+            name + " was removed as a team member",
+            name + " signed up (free account)",
+            name + " upgraded to " + plan,
+            name + " downgraded to " + plan,
+        ],
+        default=(name + ": " + activity_lower).where(plan == "", name + ": " + activity_lower + " - " + plan)
     )
     
-    # Format plan details in a compact way
-    def format_plan_details(row):
-        if pd.notna(row["plan_name"]) and pd.notna(row["plan_price_cents"]):
-            price = row["plan_price_cents"] / 100
-            interval = row["interval_unit"] if pd.notna(row["interval_unit"]) else "month"
-            interval_count = row["interval_count"] if pd.notna(row["interval_count"]) else 1
-            
-            if interval_count > 1:
-                return f"{row['plan_name']} (${price:.0f}/{interval_count} {interval}s)"
-            else:
-                return f"{row['plan_name']} (${price:.0f}/{interval})"
-        return ""
-    
-    display_activities["plan_details"] = display_activities.apply(format_plan_details, axis=1)
-    
-    # Create a compact description for each activity
-    def format_compact_description(row):
-        activity = row["activity"].lower()
-        name = row["member_name"]
-        is_education = row.get("is_education", False)
-        category = row.get("category", "")
-        
-        # Make name a link if we have a member URL
-        if pd.notna(row["memberful_url"]):
-            name = f"[{name}]({row['memberful_url']})"
-            
-        plan = row["plan_details"]
-        
-        # Add education indicator for plan if applicable
-        if is_education and plan:
-            # Extract the plan name but remove the price since it's an education plan
-            plan_name_only = plan.split(" ($")[0]
-            plan = f"{plan_name_only} (Free - Education membership)"
-        
-        # Handle education members specifically
-        if is_education:
-            if "new subscription" in activity.lower() or "new order" in activity.lower():
-                return f"{name} joined with {plan}"
-            elif "renewed" in activity.lower():
-                return f"{name} renewed {plan}"
-            elif "deactivated" in activity.lower():
-                return f"{name} cancelled {plan}"
-            elif "disabled" in activity.lower():
-                return f"{name} disabled auto-renewal for {plan}"
-            elif "upgrade" in activity.lower() or "downgrade" in activity.lower():
-                return f"{name} changed plan to {plan}"
-        # Handle regular members
-        elif "new subscription" in activity or "new order" in activity:
-            return f"{name} joined with {plan}"
-        elif "renewed" in activity:
-            return f"{name} renewed {plan}"
-        elif "deactivated" in activity:
-            return f"{name} cancelled {plan}"
-        elif "disabled" in activity:
-            return f"{name} disabled auto-renewal for {plan}"
-        elif "team member" in activity:
-            if "added" in activity:
-                return f"{name} was added as a team member"
-            else:
-                return f"{name} was removed as a team member"
-        elif "free signup" in activity:
-            return f"{name} signed up (free account)"
-        elif "plan" in activity:
-            if "upgrade" in activity:
-                return f"{name} upgraded to {plan}"
-            elif "downgrade" in activity:
-                return f"{name} downgraded to {plan}"
-        
-        # Default case
-        if plan:
-            return f"{name}: {activity} - {plan}"
-        else:
-            return f"{name}: {activity}"
+    return page_activities
+
+def show_member_activities(activities_df):
+    """
+    Display recent member activities in reverse chronological order with pagination and filtering
+    
+    Args:
+        activities_df (pd.DataFrame): DataFrame of processed activities
+    """
+    if activities_df.empty:
+        st.info("No activity data available to display")
+        return
     
-    display_activities["compact_description"] = display_activities.apply(format_compact_description, axis=1)
+    st.subheader("Recent membership activities")
+    
+    # Number of activities to show per page
+    page_size = 50
     
-    # Sort by created_at in descending order (newest first)
+    # Create a copy of the activities dataframe to avoid modifying the original
+    display_activities = activities_df.copy()
+    
+    # Sort by created_at in descending order (newest first), before any per-row formatting
     display_activities = display_activities.sort_values("created_at", ascending=False)
     
+    # Format activity types, labelling any failed renewal type and title-casing unknown ones
+    activity_type = display_activities["type"].astype(str)
+    is_failed_renewal = activity_type.str.contains("renewal", regex=False) & activity_type.str.contains("failed", regex=False)
+    fallback_labels = activity_type.str.replace("_", " ").str.title().where(~is_failed_renewal, "Renewal failed")
+    display_activities["activity"] = activity_type.map(ACTIVITY_LABELS).fillna(fallback_labels)
+    
     # Get unique activity types for filtering
     activity_types = ["All types"] + sorted(display_activities["activity"].unique().tolist())
     
@@ -259,20 +236,17 @@ def show_member_activities(activities_df):
         else:
             st.write("0 items")
     
-    # Display activities for the current page
-    for i, activity in current_page_activities.iterrows():
-        # Create a compact row with emoji, description, and time
-        with st.container():
-            cols = st.columns([1, 15, 4])
-            
-            with cols[0]:
-                st.markdown(f"<div style='font-size:24px; text-align:center;'>{activity['emoji']}</div>", unsafe_allow_html=True)
-            
-            with cols[1]:
-                st.markdown(activity["compact_description"])
-            
-            with cols[2]:
-                st.caption(activity["timestamp"])
+    # Format and display only the rows on the current page, as a single markdown table
+    if not current_page_activities.empty:
+        current_page_activities = _format_feed_rows(current_page_activities)
+        descriptions = current_page_activities["compact_description"].str.replace("|", "\\|", regex=False)
+        table_rows = [
+            f"| {emoji} | {description} | {timestamp} |"
+            for emoji, description, timestamp in zip(
+                current_page_activities["emoji"], descriptions, current_page_activities["timestamp"]
+            )
+        ]
+        st.markdown("\n".join(["| | Activity | Time |", "|:-:|:--|:--|"] + table_rows))
     
     # Show pagination controls
     if total_pages > 1:
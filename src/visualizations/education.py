@@ -6,21 +6,24 @@ import streamlit as st
 import plotly.express as px
 from datetime import datetime
 
-def show_education_members(subs_df, active_count):
+def show_education_members(subs_df, active_count, active_subs=None):
     """Show education members visualization using native Streamlit charts"""
     if subs_df.empty or "is_education" not in subs_df.columns:
         st.info("No education member data available for analysis.")
         return
+    
+    if active_subs is None:
+        active_subs = subs_df[subs_df["active"]]
         
     # Count active education members
-    education_members = subs_df[(subs_df["active"] == True) & (subs_df["is_education"] == True)]
+    education_members = active_subs[active_subs["is_education"] == True]
     
     if education_members.empty:
         st.info("No education members found.")
         return
         
     # Create a pie chart of education vs non-education active members
-    education_count = len(education_members.drop_duplicates("member_id"))
+    education_count = education_members["member_id_code"].nunique()
     non_education_count = active_count - education_count
     
     # Calculate percentages
@@ -68,9 +71,9 @@ def show_education_members(subs_df, active_count):
     
     # Format the month names nicely
     month_display = []
-    for _, row in edu_by_month.iterrows():
+    for month_str in edu_by_month["month_str"]:
         try:
-            parts = row["month_str"].split('-')
+            parts = month_str.split('-')
             if len(parts) == 2:
                 year, month = int(parts[0]), int(parts[1])
                 month_name = f"{['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'][month-1]} {year}"
@@ -6,15 +6,16 @@ import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
+from dateutil.tz import tzlocal
 
-def show_member_growth(subs_df, activities_df=None, members_data=None):
+def show_member_growth(subs_df, activities_df=None, orders_df=None):
     """
     Show member growth visualization using Streamlit charts
     
     Args:
         subs_df: DataFrame of subscription data
         activities_df: Optional DataFrame of activity data from the Memberful API
-        members_data: Optional raw members data including orders
+        orders_df: Optional DataFrame of every member's orders from flatten_orders
     """
     if subs_df.empty:
         st.info("No subscription data available for growth chart.")
@@ -235,7 +236,7 @@ def show_member_growth(subs_df, activities_df=None, members_data=None):
     
     # Calculate the current active member count
     active_members = subs_df[subs_df["active"] == True]
-    current_active_count = len(active_members.drop_duplicates("member_id"))
+    current_active_count = active_members["member_id_code"].nunique()
     
     # For each month, calculate the total active members working backwards from current count
     all_months_sorted = sorted(all_months)
@@ -382,46 +383,23 @@ def show_member_growth(subs_df, activities_df=None, members_data=None):
         st.info("No membership data available to display.")
         
     # PART 3: Monthly Revenue by Month
-    if members_data:
+    if orders_df is not None:
         st.subheader("Monthly revenue")
         
-        # Create a dictionary to store total revenue by month
-        monthly_revenue = {}
+        # Completed orders with a timestamp, bucketed by local-time month in one groupby
+        completed = orders_df[(orders_df["status"] == "completed") & (orders_df["createdAt"] != 0)]
+        order_dates = pd.to_datetime(completed["createdAt"], unit="s", utc=True).dt.tz_convert(tzlocal())
+        order_months = order_dates.dt.tz_localize(None).dt.to_period("M")
+        monthly_revenue = completed["totalCents"].groupby(order_months).sum()
         
-        # Process orders by month
-        for member in members_data:
-            for order in member.get("orders", []):
-                if order.get("status") == "completed":
-                    # Get order timestamp and convert to date
-                    timestamp = order.get("createdAt")
-                    if timestamp:
-                        # Convert timestamp to datetime
-                        order_date = datetime.fromtimestamp(timestamp)
-                        # Create month key (e.g., "Jan 2024")
-                        month_key = order_date.strftime("%b %Y")
-                        
-                        # Get order amount
-                        amount_cents = order.get("totalCents", 0)
-                        
-                        # Add to monthly total
-                        if month_key in monthly_revenue:
-                            monthly_revenue[month_key] += amount_cents
-                        else:
-                            monthly_revenue[month_key] = amount_cents
-        
-        if monthly_revenue:
-            # Convert to DataFrame
+        if not monthly_revenue.empty:
+            # Convert to DataFrame, with month datetimes for proper sorting
             revenue_df = pd.DataFrame({
-                "Month": list(monthly_revenue.keys()),
-                "Revenue": [amt / 100 for amt in monthly_revenue.values()]  # Convert cents to dollars
+                "Month": monthly_revenue.index.strftime("%b %Y"),
+                "Revenue": monthly_revenue.to_numpy() / 100,  # Convert cents to dollars
+                "Month_dt": monthly_revenue.index.to_timestamp()
             })
             
-            # Create month datetime for proper sorting
-            revenue_df["Month_dt"] = pd.to_datetime([
-                datetime.strptime(m, "%b %Y") if isinstance(m, str) else None 
-                for m in revenue_df["Month"]
-            ])
-            
             # Sort by date
             revenue_df = revenue_df.sort_values("Month_dt")
             
@@ -7,18 +7,21 @@ import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
 
-def show_plans_and_revenue(subs_df):
+def show_plans_and_revenue(subs_df, active_subs=None):
     """Show combined membership plan and revenue visualizations"""
     if subs_df.empty:
         st.info("No subscription data available for plan distribution.")
         return
+    
+    if active_subs is None:
+        active_subs = subs_df[subs_df["active"]]
         
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader("Active membership by plan")
         # Membership plan distribution
-        plan_counts = subs_df[subs_df["active"] == True].groupby("plan").size().reset_index(name="count")
+        plan_counts = active_subs.groupby("plan", observed=True).size().reset_index(name="count")
         if not plan_counts.empty:
             # Convert to percentages for pie chart
             total = plan_counts["count"].sum()
@@ -30,9 +33,6 @@ def show_plans_and_revenue(subs_df):
                 lambda row: f"{row['plan']} ({row['percentage']}%)", axis=1
             )
             
-            # Convert to dictionary for pie chart
-            pie_data = {row["label"]: row["count"] for _, row in plan_counts.iterrows()}
-            
             # Display pie chart using Plotly
             fig = px.pie(
                 plan_counts, 
@@ -53,10 +53,10 @@ def show_plans_and_revenue(subs_df):
         st.subheader("Monthly revenue by plan")
         if not subs_df.empty:
             # Get unique subscriptions to avoid double-counting group members
-            unique_active_subs = subs_df[subs_df["active"] == True].drop_duplicates("subscription_id")
+            unique_active_subs = active_subs.drop_duplicates("subscription_id")
             
             # Group plans by monthly revenue
-            plan_revenue = unique_active_subs.groupby("plan").agg({
+            plan_revenue = unique_active_subs.groupby("plan", observed=True).agg({
                 "monthly_value": "sum",
                 "member_id": "nunique"
             }).reset_index()
@@ -74,9 +74,6 @@ def show_plans_and_revenue(subs_df):
                 lambda row: f"{row['plan']} (${row['monthly_revenue']:.0f}, {row['percentage']}%)", axis=1
             )
             
-            # Convert to dictionary for pie chart
-            revenue_pie_data = {row["label"]: row["monthly_revenue"] for _, row in plan_revenue.iterrows()}
-            
             # Display pie chart using Plotly
             fig = px.pie(
                 plan_revenue, 
@@ -148,8 +145,8 @@ def show_mrr_waterfall(mrr_changes_df):
     # Filter data for the selected month
     month_data = mrr_changes_df[mrr_changes_df["month_dt"] == selected_month_dt]
     
-    # Sort data by category order
-    month_data = month_data.sort_values("category_order")
+    # Sort data by category, which is ordered for display
+    month_data = month_data.sort_values("category")
     
     # Define category colors
     category_colors = {
@@ -409,7 +406,7 @@ def show_revenue_breakdown(activities_df):
         return
         
     # Group by month and type
-    monthly_data = recent_activities.groupby(["month_name", "category"])["mrr_impact_dollars"].sum().reset_index()
+    monthly_data = recent_activities.groupby(["month_name", "category"], observed=True)["mrr_impact_dollars"].sum().reset_index()
     
     # Filter to only include main categories
     categories = ["New members", "Reactivations", "Upgrades", "Downgrades", "Cancellations", "Failed payments"]